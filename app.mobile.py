@@ -3,7 +3,7 @@
 """app_mobile.py – Streamlit 売土地検索ツール（モバイル版）
 2025-08-16 rev8
 
-- マップは flt（緯度経度あり）で描画し、選択インデックスは edited から取得
+- マップは flt（緯度経度あり）で描画し、選択行は一覧の行選択から取得
 - 一覧の日付は空→「-」表示、ポップアップは空なら非表示
 - 行選択で該当ピンを緑で強調
 - スマホ向け：スライダー常時表示、面積上限500=500坪以上
@@ -12,59 +12,53 @@
 
 from __future__ import annotations
 
-import os
-import urllib.parse
 from pathlib import Path
-from math import radians, sin, cos, sqrt, atan2
 
+import numpy as np
 import pandas as pd
-import requests
 import streamlit as st
+import pydeck as pdk
 import folium
+from folium.plugins import FastMarkerCluster
 from streamlit_folium import st_folium
 
+from geo import radius_search
+from geocode import geocode
+from sidecar import read_sidecar, write_sidecar
+
 # ────────────────────────────────────────────────
-# 🔑 Google Maps API Key
+# 設定
 # ------------------------------------------------
+# 任意: pyarrow があれば CSV を C++ のマルチスレッドパーサで読む
 try:
-    from dotenv import load_dotenv, find_dotenv
-    load_dotenv(find_dotenv(usecwd=True), override=False)
+    import pyarrow.csv as pacsv
 except ImportError:
-    pass
+    pacsv = None
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 CSV_PATH = Path("住所付き_緯度経度付きデータ_1.csv")  # 必要に応じてパスを修正
 
+# 件数がこれを超えたら FastMarkerCluster（マーカーはブラウザ側で生成）
+CLUSTER_THRESHOLD = 200
+# row = [lat, lon, tooltip]（詳細ポップアップは選択中のピンだけ）
+# 件数が多いときのピンは canvas に描く circleMarker（DOM ノードを増やさない）
+CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 6, color: "#1e64dc", weight: 1, fillOpacity: 0.8});
+    marker.bindTooltip(row[2]);
+    return marker;
+}"""
+# さらに多い件数は folium をやめ pydeck（WebGL）の1レイヤーで描画
+DECK_THRESHOLD = 2000
+
 # ────────────────────────────────────────────────
 # ユーティリティ
 # ------------------------------------------------
-@st.cache_data(show_spinner=False)
-def geocode_address(addr: str):
-    """住所 → (lat, lon)。API キーが無い場合は (None, None)"""
-    if not GOOGLE_API_KEY:
-        return None, None
-    url = (
-        "https://maps.googleapis.com/maps/api/geocode/json?"
-        + urllib.parse.urlencode(
-            {"address": addr, "key": GOOGLE_API_KEY, "language": "ja"}, safe=":"
-        )
-    )
-    try:
-        data = requests.get(url, timeout=5).json()
-        if data.get("status") == "OK":
-            loc = data["results"][0]["geometry"]["location"]
-            return loc["lat"], loc["lng"]
-    except Exception:
-        pass
-    return None, None
-
-
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """2点間の距離 (km)"""
-    R = 6371.0
-    dlat, dlon = map(radians, (lat2 - lat1, lon2 - lon1))
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    return 2 * R * atan2(sqrt(a), sqrt(1 - a))
+def _to_num(s: pd.Series) -> pd.Series:
+    """数値化。既に数値列ならそのまま、文字列列だけ桁区切りのカンマを除いて変換"""
+    if pd.api.types.is_numeric_dtype(s):
+        return s
+    return pd.to_numeric(s.astype(str).str.replace(",", "", regex=False), errors="coerce")
 
 
 def _fmt_date(val) -> str:
@@ -80,19 +74,162 @@ def _fmt_date(val) -> str:
     return "" if s.lower() in {"", "nan", "nat", "none", "-"} else s
 
 
-@st.cache_data(show_spinner=False)
-def load_data(path: Path) -> pd.DataFrame:
-    """CSV読み込み(UTF-8/UTF-8-BOM/Shift-JIS) → 列整形 → 坪/坪単価計算 → 日付整形"""
-    # 1. 読み込み
-    for enc in ("utf-8-sig", "utf-8", "cp932"):
-        try:
-            df = pd.read_csv(path, encoding=enc)
-            break
-        except UnicodeDecodeError:
-            continue
+def build_popups(df: pd.DataFrame) -> list[str]:
+    """ポップアップ HTML を列ごとの文字列演算でまとめて生成（行ループなし）"""
+    if df.empty:
+        return []  # 空の数値列の書式化は str にならず、連結で TypeError になる
+
+    def col(name: str, default="-") -> pd.Series:
+        return df[name] if name in df.columns else pd.Series(default, index=df.index, dtype=object)
+
+    def num(name: str, fmt: str, default: str) -> pd.Series:
+        """数値列を書式化した文字列に（欠損・非数値は default）"""
+        v = pd.to_numeric(col(name, None), errors="coerce")
+        return v.map(fmt.format, na_action="ignore").fillna(default).astype(str)
+
+    price_col = "登録価格（万円）" if "登録価格（万円）" in df.columns else "価格(万円)"
+    # 日付（一覧では「-」にしているが、ポップアップでは空扱いにする）。category なら種類ごとに1回
+    dates = col("日付", "").map(_fmt_date).astype(str)
+    date_html = pd.Series(
+        np.where(dates != "", "日付：" + dates + "<br>", ""), index=df.index, dtype=object
+    )
+    html = (
+        "<b>" + col("住所").astype(str) + "</b><br>"
+        + date_html
+        + "価格：" + num(price_col, "{:,.0f}", "-") + " 万円<br>"
+        + num("土地面積（坪）", "面積：{:.1f} 坪<br>", "")
+        + num(
+            "坪単価（万円/坪）",
+            "<span style='color:#d46b08;'>坪単価：{:.1f} 万円/坪</span><br>",
+            "",
+        )
+        + "登録会員：" + col("登録会員").astype(str)
+        + "<br>TEL：" + col("TEL").astype(str)
+    )
+    return html.tolist()
+
+
+def build_tooltips(df: pd.DataFrame) -> list[str]:
+    """ピン用の1行テキスト（住所｜価格｜面積）。ポップアップより軽く、タップでも表示される"""
+    if df.empty:
+        return []  # 空の数値列の map は str にならず、連結で TypeError になる
+    price_col = "登録価格（万円）" if "登録価格（万円）" in df.columns else "価格(万円)"
+    price = pd.to_numeric(df[price_col], errors="coerce")
+    price = price.map("{:,.0f} 万円".format, na_action="ignore")
+    area = pd.to_numeric(df["土地面積（坪）"], errors="coerce")
+    area = area.map("{:.1f} 坪".format, na_action="ignore")
+    addr = df["住所"].astype(str) if "住所" in df.columns else "-"
+    return (addr + "｜" + price.fillna("- 万円") + "｜" + area.fillna("- 坪")).tolist()
+
+
+def build_deck(df: pd.DataFrame, lat0: float, lon0: float, selected_idx=None) -> pdk.Deck:
+    """大量件数向け：ScatterplotLayer 1枚で描画（選択行は緑、検索中心は赤）"""
+    data = pd.DataFrame(
+        {
+            "lat": df["latitude"].to_numpy(),
+            "lon": df["longitude"].to_numpy(),
+            "addr": df["住所"].astype(str).to_numpy(),
+            "tanka": df["坪単価（万円/坪）"].round(1).to_numpy(),
+            "color": [[0, 160, 0] if i == selected_idx else [30, 100, 220] for i in df.index],
+        }
+    )
+    points = pdk.Layer(
+        "ScatterplotLayer", data=data, get_position=["lon", "lat"],
+        get_radius=30, get_fill_color="color", pickable=True,
+    )
+    center = pdk.Layer(
+        "ScatterplotLayer", data=[{"lat": lat0, "lon": lon0}], get_position=["lon", "lat"],
+        get_radius=60, get_fill_color=[220, 30, 30],
+    )
+    return pdk.Deck(
+        layers=[points, center],
+        initial_view_state=pdk.ViewState(latitude=lat0, longitude=lon0, zoom=14),
+        tooltip={"text": "{addr}\n坪単価：{tanka} 万円/坪"},
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def marker_rows(data_key: tuple, row_key: tuple, _flt: pd.DataFrame) -> list[list]:
+    """同じデータ・結果行の間はピンの [lat, lon, tooltip] を使い回す（地図オブジェクトはキャッシュしない）"""
+    # 座標の無い行は load_data で落としてあるのでそのまま並べる
+    lats = _flt["latitude"].to_numpy(dtype=float).tolist()
+    lons = _flt["longitude"].to_numpy(dtype=float).tolist()
+    return [list(t) for t in zip(lats, lons, build_tooltips(_flt))]
+
+
+def build_map(center: tuple, flt: pd.DataFrame, rows: list[list]) -> folium.Map:
+    """毎回新しい folium.Map を組む（st_folium が選択ピンのレイヤーを渡した地図に足すため）"""
+    lat0, lon0 = center
+    m = folium.Map(location=[lat0, lon0], zoom_start=14, control_scale=True, prefer_canvas=True)
+    folium.Marker(
+        [lat0, lon0],
+        tooltip="検索中心",
+        icon=folium.Icon(color="red", icon="star"),
+    ).add_to(m)
+
+    # 件数が多いときはクラスタにまとめる
+    if len(rows) > CLUSTER_THRESHOLD:
+        FastMarkerCluster(rows, callback=CLUSTER_CALLBACK).add_to(m)
     else:
-        st.error("CSV読み込みに失敗しました。文字コードをご確認ください。")
-        st.stop()
+        for lat, lon, tip in rows:
+            # 詳細ポップアップは付けない（選択行だけ別レイヤーで付与）
+            # アイコン画像ではなく canvas に描く円（クラスタ時の circleMarker と同じ見た目）
+            folium.CircleMarker(
+                [lat, lon],
+                radius=6,
+                color="#1e64dc",
+                weight=1,
+                fill=True,
+                fill_opacity=0.8,
+                tooltip=tip,
+            ).add_to(m)
+
+    # すべてのピンが入るように（中心と全ピンの最小・最大を列単位で）
+    if len(flt):
+        lats = flt["latitude"].to_numpy()
+        lons = flt["longitude"].to_numpy()
+        sw = [min(lat0, float(np.nanmin(lats))), min(lon0, float(np.nanmin(lons)))]
+        ne = [max(lat0, float(np.nanmax(lats))), max(lon0, float(np.nanmax(lons)))]
+        m.fit_bounds([sw, ne], padding=(20, 20))
+    return m
+
+
+def _read_csv_arrow(path: Path) -> pd.DataFrame | None:
+    """pyarrow で CSV 読み込み（UTF-8/UTF-8-BOM のみ）。失敗時は None"""
+    if pacsv is None:
+        return None
+    try:
+        opts = pacsv.ConvertOptions(
+            strings_can_be_null=True,  # 空文字は NaN（pandas と同じ）
+            # 座標列は推論させず float32 で直接読む（無い列名は無視される）
+            column_types={c: "float32" for c in ("latitude", "longitude", "lat", "lng")},
+        )
+        return pacsv.read_csv(path, convert_options=opts).to_pandas()
+    except Exception:  # Shift-JIS など → pandas 側で再試行
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def load_data(path: Path) -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """CSV読み込み(UTF-8/UTF-8-BOM/Shift-JIS) → 列整形 → 坪/坪単価計算 → 日付整形 → 60坪以下除外
+
+    (df, 緯度配列, 経度配列) を返す。配列は df の列を指す（コピーなし）
+    """
+    # 1. 読み込み（CSVより新しい Parquet があればそちらを使う）
+    df = read_sidecar(path)
+    if df is None:
+        df = _read_csv_arrow(path)
+        if df is None:
+            for enc in ("utf-8-sig", "utf-8", "cp932"):
+                try:
+                    df = pd.read_csv(path, encoding=enc)
+                    break
+                except UnicodeDecodeError:
+                    continue
+            else:
+                st.error("CSV読み込みに失敗しました。文字コードをご確認ください。")
+                st.stop()
+        write_sidecar(df, path)
 
     # 2. 列名整形
     df.columns = df.columns.str.strip()
@@ -101,6 +238,11 @@ def load_data(path: Path) -> pd.DataFrame:
     if not {"latitude", "longitude"}.issubset(df.columns):
         st.error("CSVに latitude/longitude 列が見当たりません。")
         st.stop()
+    # 座標は float32（GPS精度には十分、距離計算で読むバイト数が半分）
+    for c in ("latitude", "longitude"):
+        df[c] = pd.to_numeric(df[c], errors="coerce").astype("float32")
+    # 座標の無い行は検索対象にならないので読み込み時に落とす
+    df = df.dropna(subset=["latitude", "longitude"])
 
     # 3. 面積(坪)列の生成（㎡→坪換算）
     if "土地面積（坪）" not in df.columns:
@@ -111,24 +253,32 @@ def load_data(path: Path) -> pd.DataFrame:
             st.stop()
 
     # 4. 数値化
-    df["土地面積（坪）"] = pd.to_numeric(
-        df["土地面積（坪）"].astype(str).str.replace(",", ""), errors="coerce"
-    )
+    df["土地面積（坪）"] = _to_num(df["土地面積（坪）"])
 
     # 5. 坪単価計算
     price_col = "登録価格（万円）" if "登録価格（万円）" in df.columns else "価格(万円)"
-    df[price_col] = pd.to_numeric(df[price_col].astype(str).str.replace(",", ""), errors="coerce")
+    df[price_col] = _to_num(df[price_col])
     df["坪単価（万円/坪）"] = (df[price_col] / df["土地面積（坪）"]).round(1)
 
     # 6. 日付列の統一（候補を広げる）
     date_candidates = ("日付", "掲載日", "更新日", "掲載開始日", "公開日", "最終更新日", "更新日時")
     date_src = next((c for c in date_candidates if c in df.columns), None)
     if date_src:
-        df["日付"] = df[date_src].map(_fmt_date)
+        # _fmt_date と同じ判定を列単位で（行ごとの Python 呼び出しなし）
+        s = df[date_src].astype("string").str.strip()
+        blank = s.isna() | s.str.lower().isin(["", "nan", "nat", "none", "-"])
+        df["日付"] = s.mask(blank, "").astype(object)
     else:
         df["日付"] = ""
 
-    return df
+    # 7. 種類の少ない文字列列は category に（日付も掲載日ごとにほぼ重複）
+    for c in ("用途地域", "取引態様", "登録会員", "日付"):
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+
+    # 8. 60坪以下を除外し、距離計算用の座標配列も一緒にキャッシュ
+    df = df[df["土地面積（坪）"] > 60].reset_index(drop=True)
+    return df, df["latitude"].to_numpy(), df["longitude"].to_numpy()
 
 
 # ────────────────────────────────────────────────
@@ -137,12 +287,6 @@ def load_data(path: Path) -> pd.DataFrame:
 st.set_page_config(page_title="売土地検索 (モバイル)", page_icon="🏠", layout="centered")
 st.title("🏠 売土地検索（モバイル版）")
 
-# ────────────────────────────────────────────────
-# データロード & 60坪以下除外
-# ------------------------------------------------
-_df = load_data(CSV_PATH)
-_df = _df[_df["土地面積（坪）"] > 60].reset_index(drop=True)
-
 # ────────────────────────────────────────────────
 # 住所入力
 # ------------------------------------------------
@@ -151,15 +295,21 @@ address = st.text_input("例：浜松市中央区高林1丁目")
 if not address:
     st.stop()
 
-center_lat, center_lon = geocode_address(address.strip())
+center_lat, center_lon = geocode(address)
 if center_lat is None:
     st.warning("住所が見つかりませんでした。再入力してください。")
     st.stop()
 
+# ────────────────────────────────────────────────
+# データロード（60坪以下除外済み・住所が決まってから読む）
+# ------------------------------------------------
+_df, lat_arr, lon_arr = load_data(CSV_PATH)  # 全セッション共有のため書き換え禁止
+
 # ────────────────────────────────────────────────
 # 検索条件（スライダー常時表示）
 # ------------------------------------------------
-radius_km = st.slider("検索半径 (km)", 0.5, 5.0, 2.0, 0.1)
+MAX_RADIUS_KM = 5.0
+radius_km = st.slider("検索半径 (km)", 0.5, MAX_RADIUS_KM, 2.0, 0.1)
 
 MAX_TSUBO_UI = 500
 min_t, max_t = st.slider(
@@ -173,20 +323,32 @@ min_t, max_t = st.slider(
 # ────────────────────────────────────────────────
 # フィルタ & 距離計算
 # ------------------------------------------------
-_df["距離(km)"] = _df.apply(
-    lambda r: haversine(center_lat, center_lon, r.latitude, r.longitude),
-    axis=1,
-)
-cond = (_df["距離(km)"] <= radius_km) & (_df["土地面積（坪）"] >= min_t)
+# 候補行と距離は中心が変わったときだけ最大半径で求めてセッションに保持
+# （半径・面積スライダーだけの変更では再計算しない。全行分の距離列は作らない）
+# 行位置は読み込んだ DataFrame ごとに違うので、キャッシュ上の実体と CSV の更新時刻もキーに
+dist_key = (round(center_lat, 6), round(center_lon, 6), id(_df), CSV_PATH.stat().st_mtime_ns)
+if st.session_state.get("dist_key") != dist_key:
+    st.session_state["dist"] = radius_search(
+        center_lat, center_lon, lat_arr, lon_arr, MAX_RADIUS_KM
+    )
+    st.session_state["dist_key"] = dist_key
+cand, cand_dist = st.session_state["dist"]
+
+# 条件は候補行だけの bool 配列に out= で畳み込む（中間 Series を作らない）
+area = _df["土地面積（坪）"].to_numpy()[cand]
+cond = np.less_equal(cand_dist, radius_km)
+np.logical_and(cond, area >= min_t, out=cond)
 if max_t < MAX_TSUBO_UI:
-    cond &= _df["土地面積（坪）"] <= max_t
+    np.logical_and(cond, area <= max_t, out=cond)
 
-flt = _df[cond].copy()
-flt = flt.sort_values("坪単価（万円/坪）", ascending=False)  # indexは0..n-1のまま
+# 坪単価降順の並びは候補行の配列上で決め、iloc 1回で取り出す（sort_values のコピーを省く）
+sel = cand[cond]
+order = np.argsort(-_df["坪単価（万円/坪）"].to_numpy()[sel], kind="stable")
+flt = _df.iloc[sel[order]].assign(**{"距離(km)": cand_dist[cond][order]})  # indexは_dfのまま
 flt["距離(km)"] = flt["距離(km)"].round(2)
 
 # 一覧での見栄え用：日付が空なら「-」表示（ポップアップは空扱いにするのでOK）
-flt["日付"] = flt["日付"].apply(lambda x: x if x else "-")
+flt["日付"] = flt["日付"].cat.rename_categories(lambda x: x if x else "-")  # カテゴリ名だけ置換
 
 # ────────────────────────────────────────────────
 # 一覧テーブル（行クリック＝選択 → ピン強調）
@@ -199,113 +361,52 @@ cols_order = [
 ]
 cols = [c for c in cols_order if c in flt.columns]
 
-# 「選択」列を先頭に追加（初期 False）
-if "選択" not in flt.columns:
-    flt.insert(0, "選択", False)
-
-# 直前の選択を反映（セッション保持）
-sel_key = "selected_row_index"
-if sel_key not in st.session_state:
-    st.session_state[sel_key] = None
-if st.session_state[sel_key] is not None and 0 <= st.session_state[sel_key] < len(flt):
-    flt.loc[:, "選択"] = False
-    flt.at[st.session_state[sel_key], "選択"] = True
-
-# 表示用のテーブル（緯度経度は含めない）
-table_df = flt[["選択"] + [c for c in cols if c != "選択"]]
-
-edited = st.data_editor(
-    table_df,
+# 表示用のテーブル（緯度経度は含めない）。行クリックで1件だけ選択（読み取り専用グリッド）
+event = st.dataframe(
+    flt[cols],
     hide_index=True,
     height=320,
     use_container_width=True,
-    column_config={
-        "選択": st.column_config.CheckboxColumn(
-            "選択（1件のみ）", help="クリックで行を選択", disabled=False
-        ),
-    },
-    disabled=True,  # 全体は編集不可、上で「選択」だけ許可
-    key="editor_table",
+    on_select="rerun",
+    selection_mode="single-row",
+    key="hits_table",
 )
 
-# 単一選択に正規化 & インデックス取得（この index は flt の index と一致）
-true_rows = edited.index[edited["選択"] == True].to_list()
-if len(true_rows) > 1:
-    keep = true_rows[0]
-    edited.loc[:, "選択"] = False
-    edited.at[keep, "選択"] = True
-    st.session_state[sel_key] = keep
-elif len(true_rows) == 1:
-    st.session_state[sel_key] = true_rows[0]
-else:
-    st.session_state[sel_key] = None
-
-selected_idx = st.session_state[sel_key]
+# 選択位置（表示順）→ flt の index（_df の行番号）に変換
+rows = event.selection.rows
+selected_idx = flt.index[rows[0]] if rows and rows[0] < len(flt) else None
 
 # ────────────────────────────────────────────────
 # 地図表示（選択行のピンを緑色に）
 # ------------------------------------------------
 st.markdown("**③ 地図で確認**")
-m = folium.Map(location=[center_lat, center_lon], zoom_start=14, control_scale=True)
-folium.Marker(
-    [center_lat, center_lon],
-    tooltip="検索中心",
-    icon=folium.Icon(color="red", icon="star"),
-).add_to(m)
-
-bounds = [[center_lat, center_lon]]
-
-# ここは flt で回す（緯度経度あり）
-for idx, r in flt.iterrows():
-    # 価格
-    raw_price = r.get("登録価格（万円）", r.get("価格(万円)", None))
-    try:
-        price_fmt = f"{float(raw_price):,.0f}"
-    except (TypeError, ValueError):
-        price_fmt = "-"
-
-    # 日付（一覧では「-」にしているが、ポップアップでは空扱いにする）
-    date_txt = _fmt_date(r.get("日付", ""))  # 「-」→ "" に変換される
-
-    # ポップアップ HTML
-    popup_parts = [f"<b>{r.get('住所', '-')}</b>"]
-    if date_txt:
-        popup_parts.append(f"日付：{date_txt}")
-    popup_parts.append(f"価格：{price_fmt} 万円")
-    if pd.notna(r.get("土地面積（坪）")):
-        popup_parts.append(f"面積：{float(r['土地面積（坪）']):.1f} 坪")
-    if pd.notna(r.get("坪単価（万円/坪）")):
-        popup_parts.append(
-            f"<span style='color:#d46b08;'>坪単価：{float(r['坪単価（万円/坪）']):.1f} 万円/坪</span>"
-        )
-    popup_parts.append(f"登録会員：{r.get('登録会員', '-')}")
-    popup_parts.append(f"TEL：{r.get('TEL', '-')}")
-    popup_html = "<br>".join(popup_parts)
-
-    # ピン色
-    color = "green" if (selected_idx is not None and idx == selected_idx) else "blue"
+if len(flt) > DECK_THRESHOLD:
+    # 件数が非常に多いときは WebGL（pydeck）で一括描画
+    st.pydeck_chart(build_deck(flt, center_lat, center_lon, selected_idx))
+    st.caption("Powered by Streamlit ❘ Google Maps Geocoding API")
+    st.stop()
 
-    # 座標（欠損ガード）
-    try:
-        lat, lon = float(r["latitude"]), float(r["longitude"])
-    except Exception:
-        continue  # 座標欠損行はスキップ
+m = build_map((center_lat, center_lon), flt, marker_rows(dist_key, tuple(flt.index), flt))
 
+# 選択行の緑ピンだけは毎回別レイヤーで重ねる
+selected_fg = None
+if selected_idx is not None:
+    sel_row = flt.loc[[selected_idx]]
+    selected_fg = folium.FeatureGroup(name="選択中")
     folium.Marker(
-        [lat, lon],
-        popup=folium.Popup(popup_html, max_width=260),
-        tooltip=r.get("住所", "-"),
-        icon=folium.Icon(color=color, icon="home", prefix="fa"),
-    ).add_to(m)
-
-    bounds.append([lat, lon])
-
-# すべてのピンが入るように
-if len(bounds) > 1:
-    try:
-        m.fit_bounds(bounds, padding=(20, 20))
-    except Exception:
-        pass
-
-st_folium(m, width="100%", height=480)
+        [float(sel_row["latitude"].iat[0]), float(sel_row["longitude"].iat[0])],
+        popup=folium.Popup(build_popups(sel_row)[0], max_width=260),
+        tooltip=str(sel_row["住所"].iat[0]) if "住所" in sel_row.columns else "-",
+        icon=folium.Icon(color="green", icon="home", prefix="fa"),
+    ).add_to(selected_fg)
+
+# 固定 key で同じ地図の再マウントを防ぎ、地図の状態は受け取らない
+st_folium(
+    m,
+    width="100%",
+    height=480,
+    key="land-map",
+    returned_objects=[],
+    feature_group_to_add=selected_fg,
+)
 st.caption("Powered by Streamlit ❘ Google Maps Geocoding API")
@@ -13,55 +13,64 @@ realor-map-app / Streamlit  ✨デスクトップ版 rev18
 """
 
 from __future__ import annotations
-import os, re, urllib.parse
+import re
 from pathlib import Path
-from math import radians, sin, cos, sqrt, atan2
 from typing import Dict
 
+import numpy as np
 import pandas as pd
-import requests
 import streamlit as st
+import streamlit.components.v1 as components
+import pydeck as pdk
 import folium
-from streamlit_folium import st_folium
+from folium.plugins import FastMarkerCluster
+
+from geo import radius_search
+from geocode import geocode
+from sidecar import read_sidecar, write_sidecar
 
 # ──────────────────────────────────────────────
-# APIキー読み込み
+# 任意: pyarrow があれば CSV を C++ のマルチスレッドパーサで読む
 try:
-    from dotenv import load_dotenv, find_dotenv
-    load_dotenv(find_dotenv(usecwd=True), override=False)
+    import pyarrow.csv as pacsv
 except ImportError:
-    pass
+    pacsv = None
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 CSV_PATH        = Path("住所付き_緯度経度付きデータ_1.csv")
 
+# 件数がこれを超えたら FastMarkerCluster（マーカーはブラウザ側で生成）
+CLUSTER_THRESHOLD = 200
+# row = [lat, lon, popup_html, tooltip]
+# 件数が多いときのピンは canvas に描く circleMarker（DOM ノードを増やさない）
+CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 6, color: "#1e64dc", weight: 1, fillOpacity: 0.8});
+    marker.bindPopup(row[2], {maxWidth: 260});
+    marker.bindTooltip(row[3]);
+    return marker;
+}"""
+# さらに多い件数は folium をやめ pydeck（WebGL）の1レイヤーで描画
+DECK_THRESHOLD = 2000
+
 # ──────────────────────────────────────────────
-def geocode(addr: str):
-    if not GOOGLE_API_KEY:
-        return None, None
-    url = (
-        "https://maps.googleapis.com/maps/api/geocode/json?"
-        + urllib.parse.urlencode(
-            {"address": addr, "key": GOOGLE_API_KEY, "language": "ja"}, safe=":"
-        )
-    )
+def _read_csv_arrow(path: Path):
+    # UTF-8(BOM可)のみ対応。空文字は pandas と同じく NaN に。失敗時は None
+    if pacsv is None:
+        return None
     try:
-        js = requests.get(url, timeout=5).json()
-        if js.get("status") == "OK":
-            loc = js["results"][0]["geometry"]["location"]
-            return loc["lat"], loc["lng"]
-    except:
-        pass
-    return None, None
-
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    dlat, dlon = map(radians, (lat2 - lat1, lon2 - lon1))
-    a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlon/2)**2
-    return 2 * R * atan2(sqrt(a), sqrt(1-a))
-
-@st.cache_data(show_spinner="CSV読み込み中…")
-def load_csv(path: Path) -> pd.DataFrame:
+        # 座標列は推論させず float32 で直接読む（無い列名は無視される）
+        types = {k:"float32" for k, v in ALIAS.items() if v in ("lat","lon")}
+        opts = pacsv.ConvertOptions(strings_can_be_null=True, column_types=types)
+        return pacsv.read_csv(path, convert_options=opts).to_pandas()
+    except Exception:
+        return None
+
+def _read_csv(path: Path) -> pd.DataFrame:
+    df = _read_csv_arrow(path)
+    if df is not None:
+        df.columns = df.columns.str.strip()
+        return df
     for enc in ("utf-8-sig","utf-8","cp932"):
         try:
             df = pd.read_csv(path, encoding=enc)
@@ -75,6 +84,17 @@ def load_csv(path: Path) -> pd.DataFrame:
     df.columns = df.columns.str.strip()
     return df
 
+@st.cache_resource(show_spinner="CSV読み込み中…")
+def load_csv(path: Path) -> pd.DataFrame:
+    # CSVより新しい Parquet があればそちらを読む（文字コード判定・パース不要）
+    # モバイル版も同じ Parquet を書くので、型の整理は読み込み後に毎回かける
+    df = read_sidecar(path)
+    if df is not None:
+        return shrink_dtypes(df)
+    df = _read_csv(path)
+    write_sidecar(df, path)
+    return shrink_dtypes(df)
+
 # ──────────────────────────────────────────────
 ALIAS: Dict[str,str] = {
     **{k:"lon" for k in ["lon","longitude","lng","経度"]},
@@ -85,6 +105,26 @@ ALIAS: Dict[str,str] = {
     **{k:"土地面積(坪)" for k in ["土地面積(坪)","面積（坪）"]},
 }
 REQUIRED={"価格(万円)","lat","lon","所在地"}
+CATEGORY_COLS = ("用途地域","取引態様","登録会員")
+MAX_RADIUS_KM = 5.0  # 半径スライダーの上限
+
+def to_num(s: pd.Series) -> pd.Series:
+    # 数値列はそのまま返す（文字列化しない）。文字列列だけ桁区切りのカンマを除いて数値化
+    if pd.api.types.is_numeric_dtype(s):
+        return s
+    return pd.to_numeric(s.astype(str).str.replace(",", "", regex=False), errors="coerce")
+
+def shrink_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    # 座標は float32（GPS精度には十分）、種類の少ない文字列列は category に
+    for c in df.columns:
+        if ALIAS.get(c) in ("lat","lon"):
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("float32")
+    # 座標の無い行は検索対象にならないので読み込み時に落とす
+    df = df.dropna(subset=[c for c in df.columns if ALIAS.get(c) in ("lat","lon")])
+    for c in CATEGORY_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    return df
 
 def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
     df = df.rename(columns={c:ALIAS[c] for c in df.columns if c in ALIAS})
@@ -104,6 +144,65 @@ def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
         st.stop()
     return df
 
+def build_popups(df: pd.DataFrame) -> list:
+    # ポップアップ HTML を列単位でまとめて作る（行ごとの r[...] 参照を避ける）
+    n = len(df)
+    col = lambda c: df[c].to_numpy() if c in df.columns else np.full(n, "-", dtype=object)
+    dates = (["日付：%s<br>" % d for d in df["日付"].to_numpy()]
+             if "日付" in df.columns else [""] * n)
+    prices = ["-" if pd.isna(v) else f"{float(v):,}" for v in df["価格(万円)"].to_numpy()]
+    return [
+        "<b>%s</b><br>%s価格：%s 万円<br>坪単価：%.1f 万円/坪<br>土地面積：%.1f 坪<br>"
+        "登録会員：%s<br>TEL：%s" % t
+        for t in zip(col("所在地"), dates, prices, col("坪単価(万円/坪)"),
+                     col("土地面積(坪)"), col("登録会員"), col("TEL"))
+    ]
+
+def build_deck(df: pd.DataFrame, clat, clon) -> pdk.Deck:
+    # 大量件数向け：ScatterplotLayer 1枚で描画（マーカーごとの HTML/JS を出さない）
+    data = pd.DataFrame({
+        "lat": df["lat"].to_numpy(), "lon": df["lon"].to_numpy(),
+        "addr": df["所在地"].astype(str).to_numpy(),
+        "tanka": df["坪単価(万円/坪)"].round(1).to_numpy(),
+    })
+    points = pdk.Layer("ScatterplotLayer", data=data, get_position=["lon","lat"],
+                       get_radius=30, get_fill_color=[30,100,220], pickable=True)
+    center = pdk.Layer("ScatterplotLayer", data=[{"lat": clat, "lon": clon}],
+                       get_position=["lon","lat"], get_radius=60, get_fill_color=[220,30,30])
+    return pdk.Deck(layers=[points, center],
+                    initial_view_state=pdk.ViewState(latitude=clat, longitude=clon, zoom=14),
+                    tooltip={"text": "{addr}\n坪単価：{tanka} 万円/坪"})
+
+def build_map(center, df_flt):
+    clat, clon = center
+    m = folium.Map(location=[clat, clon], zoom_start=14, control_scale=True, prefer_canvas=True)
+    folium.Marker([clat, clon], tooltip="検索中心",
+                  icon=folium.Icon(color="red", icon="star")).add_to(m)
+
+    use_cluster = len(df_flt) > CLUSTER_THRESHOLD
+    cluster_rows = []
+    # 反復用ビュー（属性アクセスできるよう列名を ASCII に）
+    view = df_flt[["lat","lon","所在地"]].rename(columns={"所在地":"addr"})
+    for r, popup in zip(view.itertuples(index=False), build_popups(df_flt)):
+        if use_cluster:
+            cluster_rows.append([r.lat, r.lon, popup, str(r.addr)])
+            continue
+        # アイコン画像ではなく canvas に描く円（クラスタ時の circleMarker と同じ見た目）
+        folium.CircleMarker([r.lat, r.lon], radius=6, color="#1e64dc", weight=1,
+                            fill=True, fill_opacity=0.8,
+                            popup=folium.Popup(popup, max_width=260),
+                            tooltip=r.addr
+        ).add_to(m)
+    if cluster_rows:
+        FastMarkerCluster(cluster_rows, callback=CLUSTER_CALLBACK).add_to(m)
+    return m
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def map_html(center, row_key, _df_flt) -> str:
+    # 中心座標と結果行（index）のタプルをキーに、描画済みの地図 HTML を保持
+    # （入力が変わらない再実行では Jinja での HTML 生成もしない）
+    return build_map(center, _df_flt).get_root().render()
+
 # ──────────────────────────────────────────────
 def main():
     st.set_page_config(page_title="売土地検索ツール", layout="wide")
@@ -111,10 +210,22 @@ def main():
 
     if not CSV_PATH.exists():
         st.error(f"{CSV_PATH} が見つかりません"); return
-    df = standardize_columns(load_csv(CSV_PATH))
+
+    # 住所入力
+    st.subheader("① 検索中心の住所を入力")
+    addr = st.text_input("例：浜松市中区高林1丁目")
+    if not addr: return
+    clat, clon = geocode(addr)
+    if clat is None:
+        st.error("住所が見つかりません"); return
+
+    # 読み込み・整形は住所が決まってから（入力待ちの再実行では何もしない）
+    # load_csv はセッション間で共有 → rename 後のコピーだけを加工する
+    raw = load_csv(CSV_PATH)
+    df = standardize_columns(raw)
 
     # 数値変換＋面積・単価計算
-    df["価格(万円)"] = pd.to_numeric(df["価格(万円)"].astype(str).str.replace(",",""), errors="coerce")
+    df["価格(万円)"] = to_num(df["価格(万円)"])
     if "土地面積(坪)" not in df.columns and "土地面積(㎡)" in df.columns:
         df["土地面積(坪)"] = (pd.to_numeric(df["土地面積(㎡)"], errors="coerce")/3.305785).round(2)
     if "土地面積(㎡)" not in df.columns and "土地面積(坪)" in df.columns:
@@ -122,31 +233,34 @@ def main():
     df["土地面積(坪)"]   = pd.to_numeric(df["土地面積(坪)"], errors="coerce").round(2)
     df["坪単価(万円/坪)"] = (df["価格(万円)"] / df["土地面積(坪)"]).round(1)
 
-    # 住所入力→距離
-    st.subheader("① 検索中心の住所を入力")
-    addr = st.text_input("例：浜松市中区高林1丁目")
-    if not addr: return
-    clat, clon = geocode(addr.strip())
-    if clat is None:
-        st.error("住所が見つかりません"); return
-    df["距離(km)"] = df.apply(lambda r: haversine(clat, clon, r.lat, r.lon), axis=1)
-
     # 条件
     with st.sidebar:
         st.header("検索条件")
-        radius = st.slider("検索半径 (km)", 0.5, 5.0, 2.0, 0.1)
+        radius = st.slider("検索半径 (km)", 0.5, MAX_RADIUS_KM, 2.0, 0.1)
         tmin, tmax = st.slider("土地面積 (坪) ※500=500坪以上", 0, 500, (0, 500), step=10)
 
-    cond = (
-        (df["距離(km)"] <= radius) &
-        (df["土地面積(坪)"] >= tmin) &
-        (df["土地面積(坪)"] > 30)
-    )
+    # 候補行と距離は中心が変わったときだけ最大半径で求め、セッションに保持
+    # （半径・面積スライダーだけの変更では再計算しない。全行分の距離列は作らない）
+    # 行位置は読み込んだ DataFrame ごとに違うので、キャッシュ上の実体と CSV の更新時刻もキーに
+    dist_key = (round(clat, 6), round(clon, 6), id(raw), CSV_PATH.stat().st_mtime_ns)
+    if st.session_state.get("dist_key") != dist_key:
+        lat_arr, lon_arr = df["lat"].to_numpy(), df["lon"].to_numpy()
+        st.session_state["dist"] = radius_search(clat, clon, lat_arr, lon_arr, MAX_RADIUS_KM)
+        st.session_state["dist_key"] = dist_key
+    cand, cand_dist = st.session_state["dist"]
+
+    # 条件は候補行だけの bool 配列に out= で畳み込む（中間 Series を作らない）
+    area = df["土地面積(坪)"].to_numpy()[cand]
+    cond = np.less_equal(cand_dist, radius)
+    np.logical_and(cond, area >= tmin, out=cond)
+    np.logical_and(cond, area > 30, out=cond)
     if tmax < 500:
-        cond &= df["土地面積(坪)"] <= tmax
+        np.logical_and(cond, area <= tmax, out=cond)
 
-    # 坪単価降順でソート
-    df_flt = df[cond].sort_values("坪単価(万円/坪)", ascending=False)
+    # 坪単価降順の並びを候補行の配列上で決め、iloc 1回で取り出す（sort_values のコピーを省く）
+    sel = cand[cond]
+    order = np.argsort(-df["坪単価(万円/坪)"].to_numpy()[sel], kind="stable")
+    df_flt = df.iloc[sel[order]].assign(**{"距離(km)": cand_dist[cond][order]})
 
     # 【根本修正】２列を物理的に入れ替える
     tmp = df_flt["坪単価(万円/坪)"].copy()
@@ -162,31 +276,18 @@ def main():
     # 地図表示
     if df_flt.empty:
         st.info("該当物件なし"); return
+    if len(df_flt) > DECK_THRESHOLD:
+        st.markdown("**③ 地図で確認**")
+        st.pydeck_chart(build_deck(df_flt, clat, clon)); return
 
-    m = folium.Map(location=[clat, clon], zoom_start=14, control_scale=True)
-    folium.Marker([clat, clon], tooltip="検索中心",
-                  icon=folium.Icon(color="red", icon="star")).add_to(m)
-
-    for _, r in df_flt.iterrows():
-        raw = r["価格(万円)"]
-        price = f"{float(raw):,}" if pd.notna(raw) else "-"
-        popup = (
-            f"<b>{r['所在地']}</b><br>"
-            + (f"日付：{r.get('日付')}<br>" if "日付" in r else "")
-            + f"価格：{price} 万円<br>"
-            + f"坪単価：{r['坪単価(万円/坪)']:.1f} 万円/坪<br>"
-            + f"土地面積：{r['土地面積(坪)']:.1f} 坪<br>"
-            + f"登録会員：{r.get('登録会員','-')}<br>"
-            + f"TEL：{r.get('TEL','-')}"
-        )
-        folium.Marker([r.lat, r.lon],
-                      popup=folium.Popup(popup, max_width=260),
-                      tooltip=r["所在地"],
-                      icon=folium.Icon(color="blue", icon="home", prefix="fa")
-        ).add_to(m)
+    html = map_html((clat, clon), tuple(df_flt.index), df_flt)
 
     st.markdown("**③ 地図で確認**")
-    st_folium(m, width="100%", height=600)
+    # 地図からの戻り値は使わないので st_folium を通さず HTML をそのまま表示
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=600)
+    else:
+        components.html(html, height=600)  # 旧バージョンの Streamlit
 
 if __name__ == "__main__":
     main()
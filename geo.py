@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""geo.py – 距離計算・半径検索の共通処理（app.py / app.mobile.py 共用）"""
+
+from __future__ import annotations
+
+from math import radians, sin, cos, sqrt, asin
+
+import numpy as np
+import streamlit as st
+
+# 空間インデックス（sklearn が無ければ矩形での足切り＋NumPy の距離計算にフォールバック）
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:
+    BallTree = None
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """2点間の距離 (km)"""
+    R = 6371.0
+    dlat, dlon = map(radians, (lat2 - lat1, lon2 - lon1))
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * R * asin(sqrt(min(1.0, a)))  # atan2(√a, √(1-a)) と同値で sqrt が1回
+
+
+def haversine_vec(lat0: float, lon0: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """中心1点 → N点の距離 (km) を NumPy でまとめて計算（スカラーは math 版へ）"""
+    if np.isscalar(lats):
+        return haversine(lat0, lon0, lats, lons)
+    lat0r = np.radians(lat0)
+    latsr = np.radians(lats)
+    dlat = latsr - lat0r
+    dlon = np.radians(lons - lon0)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat0r) * np.cos(latsr) * np.sin(dlon / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bbox_mask(
+    lat0: float, lon0: float, lats: np.ndarray, lons: np.ndarray, radius_km: float
+) -> np.ndarray:
+    """半径 radius_km を囲む緯度経度の矩形に入る行だけ True（haversine 前の足切り）"""
+    dlat_deg = radius_km / 111.0
+    dlon_deg = radius_km / (111.0 * max(cos(radians(lat0)), 0.01))  # 極付近で 0 割りしない
+    return (np.abs(lats - lat0) <= dlat_deg) & (np.abs(lons - lon0) <= dlon_deg)
+
+
+@st.cache_resource(show_spinner=False)
+def build_tree(lats: np.ndarray, lons: np.ndarray):
+    """座標の BallTree（haversine）を一度だけ構築。sklearn 無し/座標なしなら None"""
+    if BallTree is None:
+        return None
+    valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))  # 欠損行は除外
+    if valid.size == 0:
+        return None
+    rad = np.radians(np.column_stack([lats[valid], lons[valid]]).astype(np.float64))
+    return BallTree(rad, metric="haversine"), valid
+
+
+def radius_search(
+    lat0: float, lon0: float, lats: np.ndarray, lons: np.ndarray, radius_km: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """半径内の候補行の (位置, 距離km)。BallTree があれば木の C 実装で距離まで求める"""
+    index = build_tree(lats, lons)
+    if index is None:
+        pos = np.flatnonzero(bbox_mask(lat0, lon0, lats, lons, radius_km))  # 矩形内の行だけ
+        return pos, haversine_vec(lat0, lon0, lats[pos], lons[pos])
+    tree, valid = index
+    hit, d = tree.query_radius(
+        [[radians(lat0), radians(lon0)]], r=radius_km / 6371.0, return_distance=True
+    )
+    order = np.argsort(valid[hit[0]])  # 行順に並べ直す
+    return valid[hit[0]][order], d[0][order] * 6371.0
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""geocode.py – 住所 → 座標（Google Geocoding API ＋ 永続キャッシュ、app.py / app.mobile.py 共用）"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import urllib.parse
+from pathlib import Path
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ────────────────────────────────────────────────
+# 🔑 Google Maps API Key（.env → 環境変数 → st.secrets の順）
+# ------------------------------------------------
+try:
+    from dotenv import load_dotenv, find_dotenv
+    load_dotenv(find_dotenv(usecwd=True), override=False)
+except ImportError:
+    pass
+
+GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
+if not GOOGLE_API_KEY:
+    try:
+        GOOGLE_API_KEY = st.secrets.get("GOOGLE_MAPS_API_KEY", "")
+    except Exception:
+        pass  # secrets.toml 無し
+GEOCODE_DB = Path("geocode_cache.sqlite")  # ジオコーディング結果の永続キャッシュ（両アプリ共用）
+GEOCODE_INTERVAL = 1 / 50  # Geocoding API は 50 QPS まで
+GEOCODE_TTL = 30 * 86400  # 座標の保存は 30 日まで（Google の利用規約）
+
+# Geocoding API 用 HTTP セッション（keep-alive で TLS ハンドシェイクを使い回す）
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        # 一時的な 5xx は短い間隔で2回まで再試行
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(500, 502, 503, 504)),
+    ),
+)
+
+
+@st.cache_resource
+def _geocode_db() -> sqlite3.Connection:
+    """住所→座標の永続キャッシュ（プロセス再起動後も API を叩かない）"""
+    db = sqlite3.connect(GEOCODE_DB, check_same_thread=False)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS gc(addr TEXT PRIMARY KEY, lat REAL, lng REAL, ts REAL)"
+    )
+    try:
+        db.execute("ALTER TABLE gc ADD COLUMN ts REAL")  # 旧形式のファイル（ts 無し行は期限切れ扱い）
+    except sqlite3.OperationalError:
+        pass
+    return db
+
+
+@st.cache_resource
+def _geocode_limiter() -> dict:
+    """全セッション共有の呼び出し間隔制御（同時アクセスで 429 を出さない）"""
+    return {"lock": threading.Lock(), "last": 0.0}
+
+
+def norm_addr(addr: str) -> str:
+    """キャッシュキー用に NFKC 正規化し、全角/半角スペースを除去"""
+    return unicodedata.normalize("NFKC", addr).replace(" ", "").replace("　", "")
+
+
+@st.cache_data(ttl=86400, max_entries=10_000, show_spinner=False)
+def _geocode(key: str, _query: str):
+    """正規化住所 key でキャッシュを引き、API には入力どおりの住所 _query を送る
+
+    失敗は LookupError（st.cache_data は例外を保存しないので成功だけがメモ化される）
+    """
+    db = _geocode_db()
+    hit = db.execute(
+        "SELECT lat, lng FROM gc WHERE addr=? AND ts>=?", (key, time.time() - GEOCODE_TTL)
+    ).fetchone()
+    if hit:
+        return hit
+    if not GOOGLE_API_KEY:
+        raise LookupError("GOOGLE_API_KEY 未設定")
+    url = (
+        "https://maps.googleapis.com/maps/api/geocode/json?"
+        + urllib.parse.urlencode(
+            {"address": _query, "key": GOOGLE_API_KEY, "language": "ja"}, safe=":"
+        )
+    )
+    lim = _geocode_limiter()
+    with lim["lock"]:
+        wait = lim["last"] + GEOCODE_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        lim["last"] = time.monotonic()
+    try:
+        data = _SESSION.get(url, timeout=5).json()
+        if data.get("status") == "OK":
+            loc = data["results"][0]["geometry"]["location"]
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO gc VALUES (?, ?, ?, ?)",
+                    (key, loc["lat"], loc["lng"], time.time()),
+                )
+            return loc["lat"], loc["lng"]
+    except Exception:
+        pass
+    raise LookupError(_query)
+
+
+def geocode(addr: str):
+    """住所 → (lat, lon)。見つからない・API キーが無い場合は (None, None)"""
+    try:
+        return _geocode(norm_addr(addr), addr.strip())
+    except LookupError:
+        return None, None
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""sidecar.py – CSV 横の Parquet キャッシュの読み書き（app.py / app.mobile.py 共用）"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+
+def read_sidecar(path: Path) -> pd.DataFrame | None:
+    """CSV より新しい <csv>.parquet があれば読む。無い・古い・壊れている場合は None"""
+    pq = path.with_suffix(".parquet")
+    try:
+        if pq.stat().st_mtime < path.stat().st_mtime:
+            return None
+        return pd.read_parquet(pq)
+    except Exception:  # 無い / 書きかけ・破損 → CSV から読み直して上書きさせる
+        return None
+
+
+def write_sidecar(df: pd.DataFrame, path: Path) -> None:
+    """<csv>.parquet を一時ファイル経由で置き換える（書きかけのファイルを見せない）"""
+    pq = path.with_suffix(".parquet")
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(dir=pq.parent, prefix=f".{pq.stem}-", suffix=".parquet")
+        os.close(fd)
+        os.chmod(tmp, 0o644)  # mkstemp は 0600 で作るので通常のファイルと揃える
+        df.to_parquet(tmp, compression="snappy")
+        os.replace(tmp, pq)  # 同じディレクトリ内なので置き換えは原子的
+        tmp = None
+    except Exception:
+        pass  # 書き込めない環境では毎回CSVから
+    finally:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)